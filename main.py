@@ -1,40 +1,66 @@
+from functools import lru_cache
+from hashlib import md5
 from ipaddress import ip_address
-from typing import Callable
+import mimetypes
 import re
+import time
 from pathlib import Path
-import redis.asyncio as redis
+import uvicorn
 from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi_limiter import FastAPILimiter
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, Response, FileResponse, ORJSONResponse
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from starlette.types import ASGIApp, Receive, Scope, Send
 from src.database.db import get_db
+from src.database.cache import cache, pool
 from src.routes import contacts, auth, users
-from src.conf.config import config
-from fastapi_limiter.depends import RateLimiter
+from src.services.limiter import SlidingWindowRateLimiter
+from src.services.auth import start_hash_pool, stop_hash_pool
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 BASE_DIR = Path(__file__).parent
 directory = BASE_DIR.joinpath("src").joinpath("static")
-app.mount("/static", StaticFiles(directory=directory), name="static")
 app.include_router(auth.router, prefix="/api")
 app.include_router(contacts.router, prefix="/api")
 app.include_router(users.router, prefix="/api")
 
 ALLOWED_IPS = [
-    ip_address("192.168.1.0"),
-    ip_address("172.16.0.0"),
-    ip_address("127.0.0.1"),
+    "192.168.1.0",
+    "172.16.0.0",
+    "127.0.0.1",
 ]
+allow_all_ips = "*" in ALLOWED_IPS
+allowed_ips = frozenset(ip_address(ip) for ip in ALLOWED_IPS if ip != "*")
 
-banned_ips = [
+banned_ips = frozenset({
     ip_address("192.168.1.1"),
     ip_address("192.168.1.2"),
     # ip_address("127.0.0.1"),
-]
+})
+
+
+@lru_cache(maxsize=4096)
+def ip_rejection(host: str) -> str | None:
+    """
+    The ip_rejection function parses the client host once and decides if it may reach the app.
+    Decisions are memoized per host, so repeat clients are not parsed again.
+
+    :param host: str: The client host taken from the request
+    :return: "not_allowed" or "banned" if the host is rejected, None if it is let through
+    """
+    try:
+        ip = ip_address(host)
+    except ValueError:
+        return None if allow_all_ips else "not_allowed"
+    if not allow_all_ips and ip not in allowed_ips:
+        return "not_allowed"
+    if ip in banned_ips:
+        return "banned"
+    return None
+
 
 origins = ["http://localhost:3000", "http://127.0.0.1:8000/"]
 
@@ -47,73 +73,64 @@ app.add_middleware(
 )
 
 user_agent_ban_list = [r"Googlebot", r"Python-urllib"]
+user_agent_ban_re = re.compile("|".join(f"(?:{pattern})" for pattern in user_agent_ban_list))
 
 
-@app.middleware("http")
-async def user_agent_ban_middleware(request: Request, call_next: Callable):
+class GatekeeperMiddleware:
     """
-    The user_agent_ban_middleware function is a middleware function that checks the user-agent header of an incoming request.
-    If the user-agent matches any of the patterns in our ban list, then we return a 403 Forbidden response. Otherwise, we call
-    the next middleware function and return its response.
-
-    :param request: Request: Access the request object
-    :param call_next: Callable: Pass the request to the next middleware in line
-    :return: The jsonresponse object if the user agent matches a banned pattern
-    :doc-author: Trelent
+    The GatekeeperMiddleware class is a raw ASGI middleware that rejects unwanted clients before the app runs.
+    It checks the client's IP address against ALLOWED_IPS and banned_ips, and the user-agent header against
+    our ban list, all in one pass over the ASGI scope. A rejected request gets a pre-built 403 response;
+    no Request object is constructed on the allow path.
     """
 
-    user_agent = request.headers.get("user-agent")
-    for ban_pattern in user_agent_ban_list:
-        if re.search(ban_pattern, user_agent):
-            return JSONResponse(
-                status_code=status.HTTP_403_FORBIDDEN,
-                content={"detail": "You are banned"},
-            )
-    response = await call_next(request)
-    return response
+    not_allowed_response = JSONResponse(
+        status_code=status.HTTP_403_FORBIDDEN,
+        content={"detail": "Not allowed IP address"},
+    )
+    banned_response = JSONResponse(
+        status_code=status.HTTP_403_FORBIDDEN,
+        content={"detail": "You are banned"},
+    )
 
+    def __init__(self, app: ASGIApp):
+        self.app = app
 
-@app.middleware("http")
-async def ban_ips(request: Request, call_next: Callable):
-    """
-    The ban_ips function is a middleware function that checks if the client's IP address
-    is in the banned_ips list. If it is, then we return a JSON response with status code 403
-    and an error message. Otherwise, we call the next middleware function and return its response.
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        """
+        The __call__ function checks an incoming HTTP request and either rejects it or passes it to the app.
+        Non-HTTP scopes (lifespan, websockets) are passed through untouched.
 
-    :param request: Request: Get the ip address of the client
-    :param call_next: Callable: Call the next function in the chain
-    :return: A jsonresponse object with a status code of 403 if the client's ip address is in the banned_ips list
-    :doc-author: Trelent
-    """
-    ip = ip_address(request.client.host)
-    if ip in banned_ips:
-        return JSONResponse(
-            status_code=status.HTTP_403_FORBIDDEN, content={"detail": "You are banned"}
-        )
-    response = await call_next(request)
-    return response
+        :param scope: Scope: The ASGI connection scope
+        :param receive: Receive: The ASGI receive channel
+        :param send: Send: The ASGI send channel
+        :return: None
+        """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
+        client = scope.get("client")
+        host = client[0] if client else ""
+        rejection = ip_rejection(host)
+        if rejection == "not_allowed":
+            await self.not_allowed_response(scope, receive, send)
+            return
+        if rejection == "banned":
+            await self.banned_response(scope, receive, send)
+            return
 
-@app.middleware("http")
-async def limit_access_by_ip(request: Request, call_next: Callable):
-    """
-    The limit_access_by_ip function is a middleware function that limits access to the API by IP address.
-    It checks if the client's IP address is in ALLOWED_IPS, and if not, returns a 403 Forbidden response.
+        for name, value in scope["headers"]:
+            if name == b"user-agent":
+                if user_agent_ban_re.search(value.decode("latin-1")):
+                    await self.banned_response(scope, receive, send)
+                    return
+                break
+
+        await self.app(scope, receive, send)
 
-    :param request: Request: Get the client's ip address
-    :param call_next: Callable: Pass the next function in the
-    :return: A json response if the client ip address is not allowed
-    :doc-author: Trelent
-    """
-    ip = ip_address(request.client.host)
-    if ip not in ALLOWED_IPS:
-        return JSONResponse(
-            status_code=status.HTTP_403_FORBIDDEN,
-            content={"detail": "Not allowed IP address"},
-        )
-    response = await call_next(request)
-    print(">>>>>>>>>>>>limit_access_by_ip")
-    return response
+
+app.add_middleware(GatekeeperMiddleware)
 
 
 @app.on_event("startup")
@@ -122,38 +139,106 @@ async def startup():
     The startup function is called when the application starts up.
     It's a good place to initialize things that are needed by your app,
     like connecting to databases or initializing caches.
+    The shared Redis client is exposed as app.state.redis and backs FastAPILimiter;
+    the sliding window rate limit script is loaded once here and called by SHA afterwards.
+    The password hashing workers are started here too, instead of on the first login.
 
     :return: A list of tasks
     :doc-author: Trelent
     """
-    r = await redis.Redis(
-        host=config.REDIS_DOMAIN,
-        port=config.REDIS_PORT,
-        db=0,
-        password=config.REDIS_PASSWORD,
-    )
-    await FastAPILimiter.init(r)
+    app.state.redis = cache
+    await FastAPILimiter.init(cache)
+    await SlidingWindowRateLimiter.load_script()
+    await start_hash_pool()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    The shutdown function is called when the application stops.
+    It closes the shared Redis client, disconnects its connection pool and stops the password hashing processes.
+
+    :return: None
+    """
+    await cache.close()
+    await pool.disconnect()
+    await stop_hash_pool()
 
 
 templates = Jinja2Templates(directory=BASE_DIR / "src" / "templates")
+index_html = templates.get_template("index.html").render(our="Build for test").encode()
 
 
 @app.get("/", response_class=HTMLResponse)
-def index(request: Request):
+async def index():
     """
     The index function is executed when someone visits the root URL of our site:
     http://localhost:8000/
-    It returns a TemplateResponse, which contains both a template and data to fill in that template.
-    The first argument to TemplateResponse is the name of the template we want to use.
-    In this case, it's index.html from our templates directory.
+    The page is static, so index.html from our templates directory is rendered and encoded once at import time
+    and the same bytes are returned for every request.
 
-    :param request: Request: Get the request object
     :return: An html page with the text &quot;build for test&quot;
     :doc-author: Trelent
     """
-    return templates.TemplateResponse(
-        "index.html", {"request": request, "our": "Build for test"}
-    )
+    return HTMLResponse(index_html)
+
+
+STATIC_MAX_PRELOAD_SIZE = 1024 * 1024
+STATIC_CACHE_CONTROL = "public, max-age=86400"
+
+
+def load_static_files(root: Path) -> dict[str, tuple[bytes | None, str, str, Path]]:
+    """
+    The load_static_files function walks the static directory once and indexes every file by its url path.
+    Small files are read into memory; files larger than STATIC_MAX_PRELOAD_SIZE keep only their path
+    and are streamed from disk.
+
+    :param root: Path: The static directory
+    :return: A dict of url path to (content or None, media type, etag, file path)
+    """
+    files = {}
+    for file_path in root.rglob("*"):
+        if not file_path.is_file():
+            continue
+        media_type = mimetypes.guess_type(file_path.name)[0] or "application/octet-stream"
+        stat = file_path.stat()
+        if stat.st_size <= STATIC_MAX_PRELOAD_SIZE:
+            content = file_path.read_bytes()
+            etag = f'"{md5(content).hexdigest()}"'
+        else:
+            content = None
+            etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        files[file_path.relative_to(root).as_posix()] = (content, media_type, etag, file_path)
+    return files
+
+
+static_files = load_static_files(directory)
+
+
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"], name="static", include_in_schema=False)
+async def static(path: str, request: Request):
+    """
+    The static function serves files from src/static out of the in-memory index built at import time.
+    Only files that existed at startup are served, so no filesystem lookups happen per request.
+
+    :param path: str: The file path relative to the static directory
+    :param request: Request: Read the If-None-Match header
+    :return: The file content, a 304 response if the client copy is current, or 404
+    """
+    entry = static_files.get(path)
+    if entry is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    content, media_type, etag, file_path = entry
+    headers = {"ETag": etag, "Cache-Control": STATIC_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if content is None:
+        return FileResponse(file_path, media_type=media_type, headers=headers)
+    return Response(content=content, media_type=media_type, headers=headers)
+
+
+HEALTHCHECK_TTL = 1.0
+healthcheck_state: tuple[float, bool] = (0.0, False)
 
 
 @app.get("/api/healthchecker")
@@ -161,11 +246,17 @@ async def healthchecker(db: AsyncSession = Depends(get_db)):
     """
     The healthchecker function is a simple function that checks if the database is up and running.
     It does this by making a request to the database, which will raise an exception if it's not working.
+    A successful check is reused for HEALTHCHECK_TTL seconds, so frequent probes do not hit the database each time.
 
     :param db: AsyncSession: Inject the database session into the function
     :return: A dictionary with a message
     :doc-author: Trelent
     """
+    global healthcheck_state
+    now = time.monotonic()
+    checked_at, ok = healthcheck_state
+    if ok and now - checked_at < HEALTHCHECK_TTL:
+        return {"message": "Welcome to FastAPI!"}
     try:
         # Make request
         result = await db.execute(text("SELECT 1"))
@@ -174,7 +265,13 @@ async def healthchecker(db: AsyncSession = Depends(get_db)):
             raise HTTPException(
                 status_code=500, detail="Database is not configured correctly"
             )
+        healthcheck_state = (now, True)
         return {"message": "Welcome to FastAPI!"}
     except Exception as e:
         print(e)
+        healthcheck_state = (now, False)
         raise HTTPException(status_code=500, detail="Error connecting to the database")
+
+
+if __name__ == "__main__":
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, loop="uvloop", http="httptools")
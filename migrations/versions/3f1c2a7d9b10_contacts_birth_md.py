@@ -0,0 +1,29 @@
+"""contacts birth_md
+
+Revision ID: 3f1c2a7d9b10
+Revises: 788c3533411d
+Create Date: 2026-10-15 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a7d9b10'
+down_revision: Union[str, None] = '788c3533411d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('birth_md', sa.SmallInteger(), sa.Computed(
+        'EXTRACT(month FROM birthday) * 100 + EXTRACT(day FROM birthday)', persisted=True), nullable=True))
+    op.create_index(op.f('ix_contacts_birth_md'), 'contacts', ['birth_md'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_contacts_birth_md'), table_name='contacts')
+    op.drop_column('contacts', 'birth_md')
@@ -0,0 +1,12 @@
+import redis.asyncio as redis
+
+from src.conf.config import config
+
+pool = redis.ConnectionPool(
+    host=config.REDIS_DOMAIN,
+    port=config.REDIS_PORT,
+    db=0,
+    password=config.REDIS_PASSWORD,
+    max_connections=config.REDIS_MAX_CONNECTIONS,
+)
+cache = redis.Redis(connection_pool=pool)
@@ -1,15 +1,27 @@
 import contextlib
 
+from sqlalchemy import make_url
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 
 from src.conf.config import config
 
+ASYNCPG_CONNECT_ARGS = {
+    "statement_cache_size": 1024,
+    "server_settings": {"jit": "off"},
+}
+
 
 class DatabaseSessionManager:
     def __init__(self, url: str):
-        self._engine: AsyncEngine | None = create_async_engine(url)
+        connect_args = ASYNCPG_CONNECT_ARGS if make_url(url).drivername == "postgresql+asyncpg" else {}
+        self._engine: AsyncEngine | None = create_async_engine(url,
+                                                               pool_size=config.DB_POOL_SIZE,
+                                                               max_overflow=config.DB_MAX_OVERFLOW,
+                                                               pool_pre_ping=True,
+                                                               pool_recycle=config.DB_POOL_RECYCLE,
+                                                               connect_args=connect_args)
         self._session_maker: async_sessionmaker = async_sessionmaker(autoflush=False, autocommit=False,
-                                                                     bind=self._engine)
+                                                                     expire_on_commit=False, bind=self._engine)
 
     @contextlib.asynccontextmanager
     async def session(self):
@@ -29,5 +41,13 @@ sessionmanager = DatabaseSessionManager(config.DB_URL)
 
 
 async def get_db():
+    """
+    The get_db function yields one AsyncSession per request.
+    FastAPI caches dependency results within a request, so every Depends(get_db) in the chain
+    (auth_service.get_current_user, RoleAccess and the endpoint itself) shares this same session.
+    Routes that never ask for it, such as static files and the index page, don't create one.
+
+    :return: The database session of the current request
+    """
     async with sessionmanager.session() as session:
         yield session
@@ -1,5 +1,6 @@
 import enum
-from sqlalchemy import Column, Integer, String, Boolean, Date, func, ForeignKey, Enum
+from sqlalchemy import Column, Integer, SmallInteger, String, Boolean, Date, func, ForeignKey, Enum, Computed, Index, \
+    extract
 from sqlalchemy.orm import DeclarativeBase, relationship
 
 
@@ -9,6 +10,8 @@ class Base(DeclarativeBase):
 
 class Contact(Base):
     __tablename__ = 'contacts'
+    __table_args__ = (Index('ix_contacts_user_id_id', 'user_id', 'id'),)
+    __mapper_args__ = {'eager_defaults': True}
 
     id = Column(Integer, primary_key=True, index=True)
     first_name = Column(String(50), index=True)
@@ -16,13 +19,15 @@ class Contact(Base):
     email = Column(String(50), unique=True, index=True)
     phone_number = Column(String(15), nullable=True)
     birthday = Column(Date, nullable=False)
+    birth_md = Column(SmallInteger, Computed(extract('month', birthday) * 100 + extract('day', birthday), persisted=True),
+                      index=True)
     additional_data = Column(String(250), nullable=True)
     completed = Column(Boolean, default=False)
     created_at = Column(Date, default=func.now(), nullable=True)
     updated_at = Column(Date, default=func.now(), onupdate=func.now(), nullable=True)
 
     user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
-    user = relationship("User", backref="contacts", lazy="joined")
+    user = relationship("User", backref="contacts", lazy="raise_on_sql")
 
 
 class Role(enum.Enum):
@@ -33,6 +38,7 @@ class Role(enum.Enum):
 
 class User(Base):
     __tablename__ = 'users'
+    __mapper_args__ = {'eager_defaults': True}
     id = Column(Integer, primary_key=True)
     username = Column(String(50))
     email = Column(String(150), nullable=False, unique=True)
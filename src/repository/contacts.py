@@ -1,6 +1,6 @@
 from datetime import datetime, timedelta
-from typing import Optional
-from sqlalchemy import select, or_, and_, extract
+from typing import AsyncIterator, Optional
+from sqlalchemy import select, insert, update, delete, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.entity.models import Contact, User
 from src.schemas.contact import ContactSchema, ContactUpdate
@@ -16,6 +16,7 @@ async def search_contacts_by(db: AsyncSession, first_name: Optional[str] = None,
             first_name (Optional[str]): The contact's first name to search for. Defaults to None.
             last_name (Optional[str]): The contact's last name to search for. Defaults to None.
             email (Optional[str]): The contact's email address to search for .Defaults t
+        Only the given, non-empty criteria are OR-ed, each served by the index on its column.
 
     :param db: AsyncSession: Pass in the database session
     :param first_name: Optional[str]: Specify that the first_name parameter is optional
@@ -24,8 +25,10 @@ async def search_contacts_by(db: AsyncSession, first_name: Optional[str] = None,
     :return: A list of contacts
     :doc-author: Trelent
     """
-    stmt = select(Contact).filter(
-        or_(Contact.first_name == first_name, Contact.last_name == last_name, Contact.email == email))
+    criteria = [column == value for column, value in
+                ((Contact.first_name, first_name), (Contact.last_name, last_name), (Contact.email, email))
+                if value]
+    stmt = select(Contact).where(or_(*criteria))
     contacts = await db.execute(stmt)
     return contacts.scalars().all()
 
@@ -33,6 +36,7 @@ async def search_contacts_by(db: AsyncSession, first_name: Optional[str] = None,
 async def get_contacts_with_birthdays(limit: int, db: AsyncSession):
     """
     The get_contacts_with_birthdays function returns a list of contacts with birthdays within the next `limit` days.
+    It compares the indexed birth_md column (month * 100 + day) against the window, wrapping over the year end.
 
     :param limit: int: Limit the number of days in the future to search for birthdays
     :param db: AsyncSession: Pass the database session to the function
@@ -41,59 +45,93 @@ async def get_contacts_with_birthdays(limit: int, db: AsyncSession):
     """
     current_date = datetime.now().date()
     end_date = current_date + timedelta(days=limit)
+    start_md = current_date.month * 100 + current_date.day
+    end_md = end_date.month * 100 + end_date.day
 
-    search = select(Contact).filter(
-        or_(
-            and_(
-                extract('month', Contact.birthday) == current_date.month,
-                extract('day', Contact.birthday) >= current_date.day
-            ),
-            and_(
-                extract('month', Contact.birthday) == end_date.month,
-                extract('day', Contact.birthday) <= end_date.day
-            ),
-            and_(
-                extract('month', Contact.birthday) == (current_date.month + 1) % 12,
-                extract('day', Contact.birthday) <= end_date.day
-            )
-        )
-    )
+    if start_md <= end_md:
+        search = select(Contact).filter(Contact.birth_md.between(start_md, end_md))
+    else:
+        search = select(Contact).filter(or_(Contact.birth_md >= start_md, Contact.birth_md <= end_md))
 
     result = await db.execute(search)
     return result.scalars().all()
 
 
-async def get_contacts(limit: int, offset: int, db: AsyncSession, user: User):
+def contacts_query(limit: int, offset: int, user: Optional[User] = None, after_id: Optional[int] = None):
     """
-    The get_contacts function returns a list of contacts for the user.
+    The contacts_query function builds the paginated select used by the contact listings, ordered by id.
+    When after_id is given, keyset pagination is used (id > after_id) and offset is ignored.
+
+    :param limit: int: Limit the number of contacts returned
+    :param offset: int: Skip the first offset number of rows
+    :param user: Optional[User]: Only select contacts of this user, or all contacts when None
+    :param after_id: Optional[int]: Select only contacts with an id greater than this one
+    :return: A select statement
+    """
+    stmt = select(Contact).order_by(Contact.id).limit(limit)
+    if user is not None:
+        stmt = stmt.where(Contact.user_id == user.id)
+    if after_id is not None:
+        stmt = stmt.where(Contact.id > after_id)
+    else:
+        stmt = stmt.offset(offset)
+    return stmt
+
+
+async def get_contacts(limit: int, offset: int, db: AsyncSession, user: User, after_id: Optional[int] = None):
+    """
+    The get_contacts function returns a list of contacts for the user, ordered by id.
+    When after_id is given, keyset pagination is used (id > after_id) and offset is ignored,
+    so deep pages cost the same as the first one. The id of the last returned contact is the next after_id.
 
     :param limit: int: Limit the number of contacts returned
     :param offset: int: Skip the first offset number of rows
     :param db: AsyncSession: Pass the database session to the function
     :param user: User: Filter the contacts by user
+    :param after_id: Optional[int]: Return only contacts with an id greater than this one
     :return: A list of contacts
     :doc-author: Trelent
     """
-    stmt = select(Contact).filter_by(user=user).offset(offset).limit(limit)
+    stmt = contacts_query(limit, offset, user, after_id)
     contacts = await db.execute(stmt)
     return contacts.scalars().all()
 
 
-async def get_all_contacts(limit: int, offset: int, db: AsyncSession):
+async def get_all_contacts(limit: int, offset: int, db: AsyncSession, after_id: Optional[int] = None):
     """
-    The get_all_contacts function returns a list of all contacts in the database.
+    The get_all_contacts function returns a list of all contacts in the database, ordered by id.
+    When after_id is given, keyset pagination is used (id > after_id) and offset is ignored.
 
     :param limit: int: Limit the number of contacts returned
     :param offset: int: Specify the number of records to skip
     :param db: AsyncSession: Pass in the database session
+    :param after_id: Optional[int]: Return only contacts with an id greater than this one
     :return: A list of contact objects
     :doc-author: Trelent
     """
-    stmt = select(Contact).offset(offset).limit(limit)
+    stmt = contacts_query(limit, offset, None, after_id)
     contacts = await db.execute(stmt)
     return contacts.scalars().all()
 
 
+async def stream_contacts(limit: int, offset: int, db: AsyncSession, user: Optional[User] = None,
+                          after_id: Optional[int] = None) -> AsyncIterator[Contact]:
+    """
+    The stream_contacts function yields the same contacts as get_contacts (or get_all_contacts when user is None)
+    one by one as the rows arrive from the database, without buffering the whole page.
+
+    :param limit: int: Limit the number of contacts returned
+    :param offset: int: Skip the first offset number of rows
+    :param db: AsyncSession: Pass the database session to the function
+    :param user: Optional[User]: Only yield contacts of this user, or all contacts when None
+    :param after_id: Optional[int]: Yield only contacts with an id greater than this one
+    :return: An async iterator of contacts
+    """
+    contacts = await db.stream_scalars(contacts_query(limit, offset, user, after_id))
+    async for contact in contacts:
+        yield contact
+
+
 async def get_contact(contact_id: int, db: AsyncSession, user: User):
     """
     The get_contact function returns a contact from the database.
@@ -104,9 +142,8 @@ async def get_contact(contact_id: int, db: AsyncSession, user: User):
     :return: A single contact or none if the contact does not exist
     :doc-author: Trelent
     """
-    stmt = select(Contact).filter_by(id=contact_id, user=user)
-    contact = await db.execute(stmt)
-    return contact.scalar_one_or_none()
+    stmt = select(Contact).where(Contact.id == contact_id, Contact.user_id == user.id)
+    return await db.scalar(stmt)
 
 
 async def create_contact(body: ContactSchema, db: AsyncSession, user: User):
@@ -119,10 +156,10 @@ async def create_contact(body: ContactSchema, db: AsyncSession, user: User):
     :return: The newly created contact
     :doc-author: Trelent
     """
-    contact = Contact(**body.model_dump(exclude_unset=True), user=user)
-    db.add(contact)
+    data = body.model_dump(exclude_unset=True)
+    data["user_id"] = user.id
+    contact = await db.scalar(insert(Contact).values(**data).returning(Contact))
     await db.commit()
-    await db.refresh(contact)
     return contact
 
 
@@ -134,17 +171,15 @@ async def update_contact(contact_id: int, body: ContactUpdate, db: AsyncSession,
     :param body: ContactUpdate: Get the data from the request body
     :param db: AsyncSession: Pass in the database session
     :param user: User: Ensure that the user is only able to update their own contacts
-    :return: A contact object, which is the same as the one we get from the database
+    :return: The updated contact, or None if the user has no contact with that id
     :doc-author: Trelent
     """
-    stmt = select(Contact).filter_by(id=contact_id, user=user)
-    result = await db.execute(stmt)
-    contact = result.scalar_one_or_none()
-    if contact:
-        for key, value in body.dict(exclude_unset=True).items():
-            setattr(contact, key, value)
-        await db.commit()
-        await db.refresh(contact)
+    stmt = (update(Contact).where(Contact.id == contact_id, Contact.user_id == user.id)
+            .values(**body.model_dump(exclude_unset=True))
+            .returning(Contact)
+            .execution_options(synchronize_session=False))
+    contact = await db.scalar(stmt)
+    await db.commit()
     return contact
 
 
@@ -155,13 +190,12 @@ async def delete_contact(contact_id: int, db: AsyncSession, user: User):
     :param contact_id: int: Specify the contact to delete
     :param db: AsyncSession: Pass in the database session
     :param user: User: Ensure that the user is only deleting their own contacts
-    :return: The contact that was deleted
+    :return: The contact that was deleted, or None if the user has no contact with that id
     :doc-author: Trelent
     """
-    stmt = select(Contact).filter_by(id=contact_id, user=user)
-    result = await db.execute(stmt)
-    contact = result.scalar_one_or_none()
-    if contact:
-        await db.delete(contact)
-        await db.commit()
+    stmt = (delete(Contact).where(Contact.id == contact_id, Contact.user_id == user.id)
+            .returning(Contact)
+            .execution_options(synchronize_session=False))
+    contact = await db.scalar(stmt)
+    await db.commit()
     return contact
@@ -1,27 +1,141 @@
+import logging
+from datetime import date
+
+import orjson
 from fastapi import Depends
-from sqlalchemy import select
+from redis.exceptions import RedisError
+from sqlalchemy import inspect, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 from libgravatar import Gravatar
 
+from src.database.cache import cache
 from src.database.db import get_db
-from src.entity.models import User
+from src.entity.models import User, Role
 from src.schemas.user import UserSchema
 
+logger = logging.getLogger(__name__)
+
+USER_CACHE_TTL = 60
+# Secrets stay out of Redis; login and token refresh read them with get_user_with_credentials.
+user_cache_excluded_fields = frozenset({"password", "refresh_token"})
+user_cache_fields = tuple(column.key for column in inspect(User).column_attrs
+                          if column.key not in user_cache_excluded_fields)
+
+
+def user_cache_key(email: str) -> str:
+    return f"u:{email}"
+
+
+def serialize_user(user: User) -> bytes:
+    """
+    The serialize_user function encodes the user's column values as JSON for the cache,
+    leaving out the password hash and the refresh token.
+
+    :param user: User: The user to cache
+    :return: The JSON encoded columns
+    """
+    return orjson.dumps({field: getattr(user, field) for field in user_cache_fields})
+
+
+def deserialize_user(data: bytes) -> User:
+    """
+    The deserialize_user function rebuilds a detached User from the JSON stored by serialize_user.
+    Only plain values are decoded, so a tampered cache entry can't run code.
+
+    :param data: bytes: The cached JSON
+    :return: A detached user that can be merged into a session without a SELECT;
+        its password and refresh_token are not loaded
+    """
+    row = orjson.loads(data)
+    for field in ("created_at", "updated_at"):
+        if row[field] is not None:
+            row[field] = date.fromisoformat(row[field])
+    if row["role"] is not None:
+        row["role"] = Role(row["role"])
+    user = User(**row)
+    make_transient_to_detached(user)
+    return user
+
+
+async def invalidate_user_cache(email: str) -> None:
+    """
+    The invalidate_user_cache function drops the cached user row for the given email.
+    It is called after every change to a user so the next read goes to the database.
+
+    :param email: str: The email of the user whose cache entry should be removed
+    :return: None
+    """
+    try:
+        await cache.delete(user_cache_key(email))
+    except RedisError as err:
+        logger.warning("Could not invalidate the cached user: %s", err)
+
+
+async def read_user_cache(email: str) -> bytes | None:
+    """
+    The read_user_cache function returns the cached user entry for the given email.
+
+    :param email: str: The email of the user
+    :return: The cached JSON, or None on a cache miss or when Redis is unavailable
+    """
+    try:
+        return await cache.get(user_cache_key(email))
+    except RedisError as err:
+        logger.warning("Could not read the cached user: %s", err)
+        return None
+
+
+async def load_user_by_email(email: str, cached: bytes | None, db: AsyncSession) -> User | None:
+    """
+    The load_user_by_email function returns the user for the given email from an already read cache entry.
+    A cached user is merged back into the session without a SELECT, so callers can still modify and commit it.
+    On a cache miss the user is read from the database and cached for USER_CACHE_TTL seconds.
+
+    :param email: str: The email of the user
+    :param cached: bytes | None: The value of the user's cache key, or None on a cache miss
+    :param db: AsyncSession: Pass the database session to the function
+    :return: A single user object or none if no user was found
+    """
+    if cached is not None:
+        return await db.merge(deserialize_user(cached), load=False)
+
+    user = await get_user_with_credentials(email, db)
+    if user is not None:
+        try:
+            await cache.set(user_cache_key(email), serialize_user(user), ex=USER_CACHE_TTL)
+        except RedisError as err:
+            logger.warning("Could not cache the user: %s", err)
+    return user
+
+
+async def get_user_with_credentials(email: str, db: AsyncSession) -> User | None:
+    """
+    The get_user_with_credentials function reads the user for the given email from the database, bypassing the cache.
+    Use it where the password hash or the refresh token is needed, as cached users don't carry them.
+
+    :param email: str: The email of the user
+    :param db: AsyncSession: Pass the database session to the function
+    :return: A single user object or none if no user was found
+    """
+    stmt = select(User).filter_by(email=email)
+    user = await db.execute(stmt)
+    return user.scalar_one_or_none()
+
 
 async def get_user_by_email(email: str, db: AsyncSession = Depends(get_db)):
     """
     The get_user_by_email function takes an email address and returns the user associated with that email.
     If no such user exists, it returns None.
+    The user is read through the Redis cache, see load_user_by_email; a cached user has no password
+    or refresh_token loaded, use get_user_with_credentials when they are needed.
 
     :param email: str: Specify the email address of the user to be retrieved
     :param db: AsyncSession: Pass the database session to the function
     :return: A single user object or none if no user was found
     :doc-author: Trelent
     """
-    stmt = select(User).filter_by(email=email)
-    user = await db.execute(stmt)
-    user = user.scalar_one_or_none()
-    return user
+    return await load_user_by_email(email, await read_user_cache(email), db)
 
 
 async def create_user(body: UserSchema, db: AsyncSession = Depends(get_db)):
@@ -43,7 +157,6 @@ async def create_user(body: UserSchema, db: AsyncSession = Depends(get_db)):
     new_user = User(**body.model_dump(), avatar=avatar)
     db.add(new_user)
     await db.commit()
-    await db.refresh(new_user)
     return new_user
 
 
@@ -59,6 +172,21 @@ async def update_token(user: User, token: str | None, db: AsyncSession):
     """
     user.refresh_token = token
     await db.commit()
+    await invalidate_user_cache(user.email)
+
+
+async def update_password(user: User, password_hash: str, db: AsyncSession) -> None:
+    """
+    The update_password function stores a new password hash for a user.
+
+    :param user: User: The user whose password hash changes
+    :param password_hash: str: The new password hash
+    :param db: AsyncSession: Pass the database session to the function
+    :return: None
+    """
+    user.password = password_hash
+    await db.commit()
+    await invalidate_user_cache(user.email)
 
 
 async def confirmed_email(email: str, db: AsyncSession) -> None:
@@ -75,6 +203,7 @@ async def confirmed_email(email: str, db: AsyncSession) -> None:
     user = await get_user_by_email(email, db)
     user.confirmed = True
     await db.commit()
+    await invalidate_user_cache(email)
 
 
 async def update_avatar_url(email: str, url: str | None, db: AsyncSession) -> User:
@@ -90,7 +219,7 @@ async def update_avatar_url(email: str, url: str | None, db: AsyncSession) -> Us
     user = await get_user_by_email(email, db)
     user.avatar = url
     await db.commit()
-    await db.refresh(user)
+    await invalidate_user_cache(email)
     return user
 
 # async def reset_password(email: str, new_password_hash: str, db: AsyncSession) -> None:
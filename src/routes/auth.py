@@ -6,6 +6,8 @@ from fastapi.security import (
 )
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.conf import messages
+from src.conf.config import config
 from src.database.db import get_db
 from src.repository import users as repositories_users
 from src.schemas.user import (
@@ -14,11 +16,15 @@ from src.schemas.user import (
     UserResponse,
     RequestEmail,
 )
-from src.services.auth import auth_service
+from src.services.auth import auth_service, pwd_context
 from src.services.email import send_email
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 get_refresh_token = HTTPBearer()
+# Existing accounts keep bcrypt hashes until their next login, so unknown emails are checked against a bcrypt
+# hash with the same rounds to take as long as them. Accounts already rehashed with argon2 answer at argon2 speed;
+# switch this to the default scheme once no bcrypt hashes remain.
+dummy_password_hash = pwd_context.handler("bcrypt").hash("dummy-password")
 
 
 @router.post(
@@ -37,7 +43,7 @@ async def signup(
 
     :param body: UserSchema: Validate the request body
     :param bt: BackgroundTasks: Add a task to the background tasks queue
-    :param request: Request: Get the base_url of the request
+    :param request: Request: Get the base_url of the request when BASE_URL is not configured
     :param db: AsyncSession: Pass the database session to the function
     :param : Get the user's email address
     :return: The new user object
@@ -46,11 +52,11 @@ async def signup(
     exist_user = await repositories_users.get_user_by_email(body.email, db)
     if exist_user:
         raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT, detail="Account already exists"
+            status_code=status.HTTP_409_CONFLICT, detail=messages.ACCOUNT_EXIST
         )
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash(body.password)
     new_user = await repositories_users.create_user(body, db)
-    bt.add_task(send_email, new_user.email, new_user.username, str(request.base_url))
+    bt.add_task(send_email, new_user.email, new_user.username, config.BASE_URL or str(request.base_url))
     return new_user
 
 
@@ -60,25 +66,30 @@ async def login(
 ):
     """
     The login function is used to authenticate a user.
+    The password is always verified, against a dummy hash when the email is unknown,
+    so a missing user and a wrong password take the same time and get the same answer.
+    Whether the email is confirmed is only revealed to a caller who knows the password.
+    Passwords stored with a deprecated scheme are hashed again after a successful login.
 
     :param body: OAuth2PasswordRequestForm: Get the username and password from the request body
     :param db: AsyncSession: Get the database session
     :return: A dict with the access token, refresh token and a bearer type
     :doc-author: Trelent
     """
-    user = await repositories_users.get_user_by_email(body.username, db)
-    if user is None:
+    user = await repositories_users.get_user_with_credentials(body.username, db)
+    password_hash = user.password if user is not None else dummy_password_hash
+    password_ok = await auth_service.verify_password(body.password, password_hash)
+    if user is None or not password_ok:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email"
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password"
         )
     if not user.confirmed:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed"
         )
-    if not auth_service.verify_password(body.password, user.password):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password"
-        )
+    if auth_service.needs_rehash(user.password):
+        password_hash = await auth_service.get_password_hash(body.password)
+        await repositories_users.update_password(user, password_hash, db)
     access_token = await auth_service.create_access_token(
         data={"sub": user.email, "test": "Сергій Багмет"}
     )
@@ -112,7 +123,7 @@ async def refresh_token(
 
     token = credentials.credentials
     email = await auth_service.decode_refresh_token(token)
-    user = await repositories_users.get_user_by_email(email, db)
+    user = await repositories_users.get_user_with_credentials(email, db)
     if user.refresh_token != token:
         await repositories_users.update_token(user, None, db)
         raise HTTPException(
@@ -170,7 +181,7 @@ async def request_email(
 
     :param body: RequestEmail: Validate the request body
     :param background_tasks: BackgroundTasks: Add a task to the background tasks queue
-    :param request: Request: Get the base url of the request
+    :param request: Request: Get the base url of the request when BASE_URL is not configured
     :param db: AsyncSession: Get the database session
     :param : Pass the email address to send the confirmation email to
     :return: A message that the user should check their email for confirmation
@@ -179,12 +190,13 @@ async def request_email(
 
     user = await repositories_users.get_user_by_email(body.email, db)
 
+    if user is None:
+        return {"message": "Check your email for confirmation."}
     if user.confirmed:
         return {"message": "Your email is already confirmed"}
-    if user:
-        background_tasks.add_task(
-            send_email, user.email, user.username, str(request.base_url)
-        )
+    background_tasks.add_task(
+        send_email, user.email, user.username, config.BASE_URL or str(request.base_url)
+    )
     return {"message": "Check your email for confirmation."}
 
 # @router.post("/reset_password")
@@ -1,19 +1,83 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Path, Query
-from fastapi_limiter.depends import RateLimiter
+import orjson
+from fastapi import APIRouter, HTTPException, Depends, status, Path, Query, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from src.entity.models import User, Role
 from src.services.auth import auth_service
+from src.services.limiter import SlidingWindowRateLimiter, AuthRateLimiter
 from src.database.db import get_db
 from src.repository import contacts as repositories_contacts
 from src.schemas.contact import ContactSchema, ContactUpdate, ContactResponse
 from src.services.roles import RoleAccess
 
 router = APIRouter(prefix='/contacts', tags=['contacts'])
-access_to_route_all = RoleAccess([Role.admin, Role.moderator])
+access_to_route_all = RoleAccess({Role.admin, Role.moderator})
+contact_response_fields = tuple(ContactResponse.model_fields)
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
 
 
-@router.get("/search", response_model=List[ContactResponse], dependencies=[Depends(RateLimiter(times=1, seconds=5))])
+def contacts_response(contacts) -> ORJSONResponse:
+    """
+    The contacts_response function serialises a list of contacts straight to JSON with orjson.
+    List endpoints return it directly, so FastAPI skips validating every row through ContactResponse.
+
+    :param contacts: A list of contact objects
+    :return: An ORJSONResponse with the ContactResponse fields of each contact
+    """
+    return ORJSONResponse([{field: getattr(contact, field) for field in contact_response_fields}
+                           for contact in contacts])
+
+
+def wants_ndjson(request: Request) -> bool:
+    """
+    The wants_ndjson function tells if the Accept header lists application/x-ndjson with a non-zero quality.
+
+    :param request: Request: Read the Accept header
+    :return: True if the client accepts newline delimited JSON
+    """
+    for media_range in request.headers.get("accept", "").split(","):
+        media_type, *params = media_range.split(";")
+        if media_type.strip().lower() != NDJSON_MEDIA_TYPE:
+            continue
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def contacts_ndjson_response(db: AsyncSession, limit: int, offset: int, user: Optional[User],
+                             after_id: Optional[int]):
+    """
+    The contacts_ndjson_response function streams a page of contacts as newline delimited JSON.
+    Each row is encoded and sent as soon as it is read, so memory use does not grow with the page size.
+    The stream reads with the request's session and closes it when done, because the get_db cleanup
+    may already have run before the body is sent. Database errors propagate and abort the response.
+
+    :param db: AsyncSession: The session of the request
+    :param limit: int: Limit the number of contacts returned
+    :param offset: int: Skip the first offset number of rows
+    :param user: Optional[User]: Only stream contacts of this user, or all contacts when None
+    :param after_id: Optional[int]: Stream only contacts with an id greater than this one
+    :return: A StreamingResponse with one JSON contact per line
+    """
+    async def rows():
+        try:
+            async for contact in repositories_contacts.stream_contacts(limit, offset, db, user, after_id):
+                yield orjson.dumps({field: getattr(contact, field) for field in contact_response_fields}) + b"\n"
+        finally:
+            await db.close()
+
+    return StreamingResponse(rows(), media_type=NDJSON_MEDIA_TYPE)
+
+
+@router.get("/search", response_model=List[ContactResponse],
+            dependencies=[Depends(SlidingWindowRateLimiter(times=1, seconds=5))])
 async def search_contacts_by(first_name: Optional[str] = Query(None),
                              last_name: Optional[str] = Query(None),
                              email: Optional[str] = Query(None),
@@ -28,77 +92,92 @@ async def search_contacts_by(first_name: Optional[str] = Query(None),
     :return: A list of contacts
     :doc-author: Trelent
     """
-    if not any([first_name, last_name, email]):
+    if not (first_name or last_name or email):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail="At least one of 'first_name', 'last_name' or 'email' parameters must be provided")
 
     contacts = await repositories_contacts.search_contacts_by(db, first_name, last_name, email)
-    return contacts
+    return contacts_response(contacts)
 
 
 @router.get("/birthdays", response_model=List[ContactResponse],
-            dependencies=[Depends(RateLimiter(times=1, seconds=5))])
+            dependencies=[Depends(SlidingWindowRateLimiter(times=1, seconds=5))])
 async def get_users_birth(limit: int = Query(7, ge=7, le=100),
                           db: AsyncSession = Depends(get_db)):
     """
-    The get_users_birth function returns a list of contacts with birthdays in the next 7 days.
+    The get_users_birth function returns a list of contacts with birthdays in the next `limit` days (7 by default).
+    The window is matched on the indexed birth_md column, so the lookup is an index range scan.
 
-    :param limit: int: Limit the number of contacts returned
+    :param limit: int: Number of days ahead to look for birthdays
     :param ge: Set a minimum value for the limit parameter
-    :param le: Limit the number of contacts returned
+    :param le: Set a maximum value for the limit parameter
     :param db: AsyncSession: Pass the database connection to the function
     :return: A list of contacts with their birthdays
     :doc-author: Trelent
     """
     contacts = await repositories_contacts.get_contacts_with_birthdays(limit, db)
-    return contacts
+    return contacts_response(contacts)
 
 
-@router.get("/", response_model=List[ContactResponse], dependencies=[Depends(RateLimiter(times=1, seconds=5))])
-async def get_contacts(limit: int = Query(10, ge=10, le=500), offset: int = Query(0, ge=0),
-                       db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
+@router.get("/", response_model=List[ContactResponse])
+async def get_contacts(request: Request, limit: int = Query(10, ge=10, le=500), offset: int = Query(0, ge=0),
+                       after: Optional[int] = Query(None, ge=0),
+                       db: AsyncSession = Depends(get_db), user: User = Depends(AuthRateLimiter(times=1, seconds=5))):
     """
     The get_contacts function returns a list of contacts.
+    Clients sending Accept: application/x-ndjson get the contacts streamed one per line instead.
 
+    :param request: Request: Read the Accept header
     :param limit: int: Limit the number of contacts returned
     :param ge: Specify that the limit must be greater than or equal to 10
     :param le: Limit the number of contacts returned
     :param offset: int: Specify the number of records to skip
     :param ge: Specify that the limit must be greater than or equal to 10
+    :param after: Optional[int]: Return contacts after this id (keyset pagination), offset is ignored
     :param db: AsyncSession: Pass the database session to the function
     :param user: User: Get the current user from the auth_service
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contacts = await repositories_contacts.get_contacts(limit, offset, db, user)
-    return contacts
+    if wants_ndjson(request):
+        return contacts_ndjson_response(db, limit, offset, user, after)
+    contacts = await repositories_contacts.get_contacts(limit, offset, db, user, after)
+    return contacts_response(contacts)
 
 
 @router.get("/all", response_model=List[ContactResponse],
-            dependencies=[Depends(access_to_route_all), Depends(RateLimiter(times=1, seconds=5))])
-async def get_all_contacts(limit: int = Query(10, ge=10, le=500), offset: int = Query(0, ge=0),
+            dependencies=[Depends(access_to_route_all),
+                          Depends(SlidingWindowRateLimiter(times=1, seconds=5))])
+async def get_all_contacts(request: Request, limit: int = Query(10, ge=10, le=500), offset: int = Query(0, ge=0),
+                           after: Optional[int] = Query(None, ge=0),
                            db: AsyncSession = Depends(get_db),
                            user: User = Depends(auth_service.get_current_user)):
     """
-    The get_all_contacts function returns a list of contacts.
+    The get_all_contacts function returns a list of contacts of all users.
+    It is only available to admins and moderators.
+    Clients sending Accept: application/x-ndjson get the contacts streamed one per line instead.
 
+    :param request: Request: Read the Accept header
     :param limit: int: Limit the number of contacts returned
     :param ge: Set a minimum value for the parameter
     :param le: Limit the number of contacts returned to 500
     :param offset: int: Skip a number of records
     :param ge: Specify a minimum value and the le parameter is used to specify a maximum value
+    :param after: Optional[int]: Return contacts after this id (keyset pagination), offset is ignored
     :param db: AsyncSession: Pass the database session to the function
-    :param user: User: Get the current user
+    :param user: User: Require an authenticated user
     :return: A list of contacts
     :doc-author: Trelent
     """
-    contacts = await repositories_contacts.get_contacts(limit, offset, db, user)
-    return contacts
+    if wants_ndjson(request):
+        return contacts_ndjson_response(db, limit, offset, None, after)
+    contacts = await repositories_contacts.get_all_contacts(limit, offset, db, after)
+    return contacts_response(contacts)
 
 
-@router.get("/{contact_id}", response_model=ContactResponse, dependencies=[Depends(RateLimiter(times=1, seconds=5))])
+@router.get("/{contact_id}", response_model=ContactResponse)
 async def get_contact(contact_id: int, db: AsyncSession = Depends(get_db),
-                      user: User = Depends(auth_service.get_current_user)):
+                      user: User = Depends(AuthRateLimiter(times=1, seconds=5))):
     """
     The get_contact function is a GET request that returns the contact with the given ID.
     It requires an authorization token in order to access it.
@@ -115,10 +194,9 @@ async def get_contact(contact_id: int, db: AsyncSession = Depends(get_db),
     return contact
 
 
-@router.post("/", response_model=ContactResponse, status_code=status.HTTP_201_CREATED,
-             dependencies=[Depends(RateLimiter(times=1, seconds=5))])
+@router.post("/", response_model=ContactResponse, status_code=status.HTTP_201_CREATED)
 async def create_contact(body: ContactSchema, db: AsyncSession = Depends(get_db),
-                         user: User = Depends(auth_service.get_current_user)):
+                         user: User = Depends(AuthRateLimiter(times=1, seconds=5))):
     """
     The create_contact function creates a new contact in the database.
 
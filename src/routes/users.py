@@ -1,4 +1,4 @@
-import pickle
+import asyncio
 
 import cloudinary
 import cloudinary.uploader
@@ -12,11 +12,11 @@ from fastapi import (
     Path,
     Query,
 )
-from fastapi_limiter.depends import RateLimiter
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.entity.models import User, Role
 from src.schemas.user import UserResponse
 from src.services.auth import auth_service
+from src.services.limiter import AuthRateLimiter
 from src.database.db import get_db
 from src.conf.config import config
 from src.repository import users as repository_users
@@ -30,12 +30,8 @@ cloudinary.config(
 )
 
 
-@router.get(
-    "/me",
-    response_model=UserResponse,
-    dependencies=[Depends(RateLimiter(times=1, seconds=5))],
-)
-async def get_current_user(user: User = Depends(auth_service.get_current_user)):
+@router.get("/me", response_model=UserResponse)
+async def get_current_user(user: User = Depends(AuthRateLimiter(times=1, seconds=5))):
     """
     The get_current_user function is a dependency that will be injected into the
         get_current_user endpoint. It uses the auth_service to retrieve the current user,
@@ -48,14 +44,10 @@ async def get_current_user(user: User = Depends(auth_service.get_current_user)):
     return user
 
 
-@router.patch(
-    "/avatar",
-    response_model=UserResponse,
-    dependencies=[Depends(RateLimiter(times=1, seconds=5))],
-)
+@router.patch("/avatar", response_model=UserResponse)
 async def update_avatar_url(
         file: UploadFile = File(),
-        user: User = Depends(auth_service.get_current_user),
+        user: User = Depends(AuthRateLimiter(times=1, seconds=5)),
         db: AsyncSession = Depends(get_db),
 ):
     """
@@ -72,11 +64,9 @@ async def update_avatar_url(
     :doc-author: Trelent
     """
     public_id = f"img/{user.email}"
-    res = cloudinary.uploader.upload(file.file, public_id=public_id, owerite=True)
+    res = await asyncio.to_thread(cloudinary.uploader.upload, file.file, public_id=public_id, overwrite=True)
     res_url = cloudinary.CloudinaryImage(public_id).build_url(
         width=250, height=250, crop="fill", version=res.get("version")
     )
     user = await repository_users.update_avatar_url(user.email, res_url, db)
-    auth_service.cache.set(user.email, pickle.dumps(user))
-    auth_service.cache.expire(user.email, 300)
     return user
@@ -29,7 +29,7 @@ class ContactResponse(BaseModel):
     id: int
     first_name: str
     last_name: str
-    email: EmailStr
+    email: str
     phone_number: Optional[str]
     birthday: Optional[date]
     additional_data: Optional[str]
@@ -1,35 +1,108 @@
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import Optional
-import redis
-import pickle
+import asyncio
+import hashlib
+import multiprocessing
+import time
 from fastapi import Depends, HTTPException, status
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
-from jose import JWTError, jwt
+from jose import JWTError, jwk, jwt
 
 from src.database.db import get_db
+from src.entity.models import User
 from src.repository import users as repository_users
 from src.conf.config import config
 
+pwd_context = CryptContext(schemes=["argon2", "bcrypt"], deprecated="auto", bcrypt__rounds=12)
+HASH_WORKERS = 2
+
+
+def new_hash_pool() -> ProcessPoolExecutor:
+    # Workers are spawned, not forked: by the first login the app process already runs threads.
+    return ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+
+hash_pool = new_hash_pool()
+
+# The signing key is built once instead of being parsed from the secret string on every encode and decode.
+jwt_key = jwk.construct(config.SECRET_KEY_JWT, config.ALGORITHM)
+jwt_algorithms = [config.ALGORITHM]
+jwt_decode_options = {"verify_aud": False, "verify_iss": False, "require_exp": True, "require_sub": True}
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def check_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def warm_up_worker() -> None:
+    pass
+
+
+async def run_in_hash_pool(func, *args):
+    """
+    The run_in_hash_pool function runs func in hash_pool, a separate process,
+    so it neither blocks the event loop nor holds the GIL.
+    If a dead worker broke the pool, the pool is replaced and the call is tried once more,
+    instead of failing every later login until the app restarts.
+
+    :param func: The module level function to run
+    :param args: The arguments of func
+    :return: The result of func
+    """
+    global hash_pool
+    loop = asyncio.get_running_loop()
+    pool = hash_pool
+    try:
+        return await loop.run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        if hash_pool is pool:
+            hash_pool = new_hash_pool()
+            pool.shutdown(wait=False)
+        return await loop.run_in_executor(hash_pool, func, *args)
+
+
+async def start_hash_pool() -> None:
+    """
+    The start_hash_pool function starts every hash worker on app startup,
+    so the first signup or login doesn't wait for a new interpreter to boot.
+
+    :return: None
+    """
+    await asyncio.gather(*(run_in_hash_pool(warm_up_worker) for _ in range(HASH_WORKERS)))
+
+
+async def stop_hash_pool() -> None:
+    """
+    The stop_hash_pool function stops the hash workers in a thread, so waiting for them does not block the event loop.
+
+    :return: None
+    """
+    await asyncio.to_thread(hash_pool.shutdown)
+
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    pwd_context = pwd_context
     SECRET_KEY = config.SECRET_KEY_JWT
     ALGORITHM = config.ALGORITHM
+    jwt_key = jwt_key
 
-    cache = redis.Redis(
-        host=config.REDIS_DOMAIN,
-        port=config.REDIS_PORT,
-        db=0,
-        password=config.REDIS_PASSWORD,
-    )
+    TOKEN_CACHE_SIZE = 4096
+    token_cache: OrderedDict[bytes, tuple[str, int]] = OrderedDict()
 
-    def verify_password(self, plain_password, hashed_password):
+    async def verify_password(self, plain_password, hashed_password):
         """
         The verify_password function takes a plain-text password and hashed
         password as arguments. It then uses the pwd_context object to verify that the
         plain-text password matches the hashed one.
+        The check runs in hash_pool, see run_in_hash_pool.
 
         :param self: Make the function a method of the user class
         :param plain_password: Store the password that is entered by the user
@@ -37,19 +110,31 @@ class Auth:
         :return: True if the plain_password is correct for hashed_password, and false otherwise
         :doc-author: Trelent
         """
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return await run_in_hash_pool(check_password, plain_password, hashed_password)
 
-    def get_password_hash(self, password: str):
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """
+        The needs_rehash function checks if a stored hash was made with a deprecated scheme (bcrypt)
+        or with weaker settings than the current policy, so it can be upgraded after a successful login.
+
+        :param self: Represent the instance of the class
+        :param hashed_password: str: The stored password hash
+        :return: True if the password should be hashed again
+        """
+        return self.pwd_context.needs_update(hashed_password)
+
+    async def get_password_hash(self, password: str):
         """
         The get_password_hash function takes a password as input and returns the hash of that password.
-        The hash is generated using the pwd_context object, which is an instance of Flask-Bcrypt's Bcrypt class.
+        The hash is generated using the module level pwd_context, which uses argon2 for new passwords.
+        Hashing runs in hash_pool, see run_in_hash_pool.
 
         :param self: Represent the instance of the class
         :param password: str: Get the password from the user
         :return: A password hash
         :doc-author: Trelent
         """
-        return self.pwd_context.hash(password)
+        return await run_in_hash_pool(hash_password, password)
 
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
@@ -71,15 +156,11 @@ class Auth:
         :doc-author: Trelent
         """
         to_encode = data.copy()
-        if expires_delta:
-            expire = datetime.utcnow() + timedelta(seconds=expires_delta)
-        else:
-            expire = datetime.utcnow() + timedelta(minutes=15)
-        to_encode.update(
-            {"iat": datetime.utcnow(), "exp": expire, "scope": "access_token"}
-        )
+        now = int(time.time())
+        expire = now + (int(expires_delta) if expires_delta else 15 * 60)
+        to_encode.update({"iat": now, "exp": expire, "scope": "access_token"})
         encoded_access_token = jwt.encode(
-            to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM
+            to_encode, self.jwt_key, algorithm=self.ALGORITHM
         )
         return encoded_access_token
 
@@ -100,15 +181,11 @@ class Auth:
         :doc-author: Trelent
         """
         to_encode = data.copy()
-        if expires_delta:
-            expire = datetime.utcnow() + timedelta(seconds=expires_delta)
-        else:
-            expire = datetime.utcnow() + timedelta(days=7)
-        to_encode.update(
-            {"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token"}
-        )
+        now = int(time.time())
+        expire = now + (int(expires_delta) if expires_delta else 7 * 24 * 60 * 60)
+        to_encode.update({"iat": now, "exp": expire, "scope": "refresh_token"})
         encoded_refresh_token = jwt.encode(
-            to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM
+            to_encode, self.jwt_key, algorithm=self.ALGORITHM
         )
         return encoded_refresh_token
 
@@ -125,7 +202,7 @@ class Auth:
         """
         try:
             payload = jwt.decode(
-                refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM]
+                refresh_token, self.jwt_key, algorithms=jwt_algorithms, options=jwt_decode_options
             )
             if payload["scope"] == "refresh_token":
                 email = payload["sub"]
@@ -140,6 +217,38 @@ class Auth:
                 detail="Could not validate credentials",
             )
 
+    def get_email_from_access_token(self, token: str) -> str | None:
+        """
+        The get_email_from_access_token function returns the email (sub) of a valid access token.
+        Decoded tokens are kept in a bounded LRU keyed by the token's blake2b digest until they expire,
+        so a client reusing its token skips the JWT signature check and claim parsing.
+
+        :param self: Represent the instance of the class
+        :param token: str: The access token from the authorization header
+        :return: The email from the token, or None if the token is invalid, expired or has the wrong scope
+        """
+        key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+        cached = self.token_cache.get(key)
+        if cached is not None:
+            email, expire = cached
+            if expire > time.time():
+                self.token_cache.move_to_end(key)
+                return email
+            del self.token_cache[key]
+
+        try:
+            payload = jwt.decode(token, self.jwt_key, algorithms=jwt_algorithms, options=jwt_decode_options)
+        except JWTError:
+            return None
+        email = payload.get("sub")
+        if payload.get("scope") != "access_token" or email is None:
+            return None
+
+        self.token_cache[key] = (email, payload["exp"])
+        if len(self.token_cache) > self.TOKEN_CACHE_SIZE:
+            self.token_cache.popitem(last=False)
+        return email
+
     async def get_current_user(
             self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
     ):
@@ -154,37 +263,39 @@ class Auth:
         :return: A user object
         :doc-author: Trelent
         """
-        credentials_exception = HTTPException(
+        email = self.get_email_from_access_token(token)
+        if email is None:
+            raise self.credentials_exception()
+        return await self.load_user(email, await repository_users.read_user_cache(email), db)
+
+    def credentials_exception(self) -> HTTPException:
+        """
+        The credentials_exception function builds the 401 response raised for a missing, invalid or unknown user token.
+
+        :param self: Represent the instance of the class
+        :return: An HTTPException to raise
+        """
+        return HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-        try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload["scope"] == "access_token":
-                email = payload["sub"]
-                if email is None:
-                    raise credentials_exception
-            else:
-                raise credentials_exception
-        except JWTError as e:
-            raise credentials_exception
-
-        user_hash = str(email)
-
-        user = self.cache.get(user_hash)
+    async def load_user(self, email: str, cached: bytes | None, db: AsyncSession) -> User:
+        """
+        The load_user function returns the user for an authenticated email.
+        It uses the user cache entry already read from Redis when there is one,
+        otherwise it reads the user from the database and caches it.
 
+        :param self: Represent the instance of the class
+        :param email: str: The email from the access token
+        :param cached: bytes | None: The value of the user's cache key, or None on a cache miss
+        :param db: AsyncSession: Get the database session
+        :return: A user object
+        """
+        user = await repository_users.load_user_by_email(email, cached, db)
         if user is None:
-
-            user = await repository_users.get_user_by_email(email, db)
-            if user is None:
-                raise credentials_exception
-            self.cache.set(user_hash, pickle.dumps(user))
-            self.cache.expire(user_hash, 300)
-        else:
-
-            user = pickle.loads(user)
+            raise self.credentials_exception()
         return user
 
     def create_email_token(self, data: dict):
@@ -200,9 +311,9 @@ class Auth:
         :doc-author: Trelent
         """
         to_encode = data.copy()
-        expire = datetime.utcnow() + timedelta(days=7)
-        to_encode.update({"iat": datetime.utcnow(), "exp": expire})
-        token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        now = int(time.time())
+        to_encode.update({"iat": now, "exp": now + 7 * 24 * 60 * 60})
+        token = jwt.encode(to_encode, self.jwt_key, algorithm=self.ALGORITHM)
         return token
 
     async def get_email_from_token(self, token: str):
@@ -216,7 +327,7 @@ class Auth:
         :doc-author: Trelent
         """
         try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = jwt.decode(token, self.jwt_key, algorithms=jwt_algorithms, options=jwt_decode_options)
             email = payload["sub"]
             return email
         except JWTError as e:
@@ -0,0 +1,140 @@
+import secrets
+import time
+
+from fastapi import Depends, Request, Response
+from fastapi.security import OAuth2PasswordBearer
+from fastapi_limiter import FastAPILimiter
+from fastapi_limiter.depends import RateLimiter
+from redis.exceptions import NoScriptError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.db import get_db
+from src.entity.models import User
+from src.repository.users import user_cache_key
+from src.services.auth import auth_service
+
+SLIDING_WINDOW_SCRIPT = """
+local key = KEYS[1]
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+if redis.call('ZCARD', key) < limit then
+    redis.call('ZADD', key, now, ARGV[4])
+    redis.call('PEXPIRE', key, window)
+    return 0
+end
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+return tonumber(oldest[2]) + window - now
+"""
+
+# Missing tokens must reach the limiter too, so the 401 is raised by AuthRateLimiter instead of the scheme.
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login", auto_error=False)
+
+
+class SlidingWindowRateLimiter(RateLimiter):
+    """
+    The SlidingWindowRateLimiter class is a RateLimiter that counts requests over a sliding window
+    instead of fastapi-limiter's fixed window, so clients can't burst twice the limit across a window edge.
+    Each check is one EVALSHA of a Lua script over a sorted set on the FastAPILimiter Redis client.
+    """
+
+    lua_sha: str | None = None
+
+    @classmethod
+    async def load_script(cls):
+        """
+        The load_script function loads the sliding window Lua script into Redis and remembers its SHA.
+        It is called once on startup, after FastAPILimiter.init.
+
+        :return: None
+        """
+        cls.lua_sha = await FastAPILimiter.redis.script_load(SLIDING_WINDOW_SCRIPT)
+
+    def _script_args(self, key: str) -> tuple:
+        """
+        The _script_args function builds the EVALSHA arguments that record one request for the key.
+
+        :param key: str: The rate limit key of the client and route
+        :return: The number of keys, the key and the script arguments
+        """
+        now = int(time.time() * 1000)
+        return 1, key, self.times, self.milliseconds, now, f"{now}:{secrets.token_hex(4)}"
+
+    async def _run_script(self, call):
+        """
+        The _run_script function awaits call, which uses lua_sha, loading the script first if needed.
+        If Redis lost the script (NOSCRIPT, e.g. after a restart), it is loaded again and call is retried once.
+
+        :param call: A function returning the awaitable that runs the script
+        :return: The result of call
+        """
+        if self.lua_sha is None:
+            await self.load_script()
+        try:
+            return await call()
+        except NoScriptError:
+            await self.load_script()
+            return await call()
+
+    async def _check(self, key: str) -> int:
+        """
+        The _check function records a request for the key and tells if it is over the limit.
+
+        :param key: str: The rate limit key of the client and route
+        :return: 0 if the request is allowed, otherwise the number of milliseconds until it would be
+        """
+        return await self._run_script(lambda: FastAPILimiter.redis.evalsha(self.lua_sha, *self._script_args(key)))
+
+
+class AuthRateLimiter(SlidingWindowRateLimiter):
+    """
+    The AuthRateLimiter class is a dependency that rate limits a route and returns the current user.
+    The rate limit script and the user cache lookup are sent to Redis in one pipeline,
+    so a protected request costs one Redis round trip instead of two.
+    Requests with a missing or invalid token are counted as well and get their 401 only after the limit check.
+    Use it in place of both SlidingWindowRateLimiter and auth_service.get_current_user on a route.
+    """
+
+    async def __call__(self, request: Request, response: Response,
+                       token: str | None = Depends(optional_oauth2_scheme),
+                       db: AsyncSession = Depends(get_db)) -> User:
+        """
+        The __call__ function checks the rate limit and the access token, then loads the user.
+
+        :param request: Request: Identify the client and the route
+        :param response: Response: Passed to the rate limit callback
+        :param token: str | None: Pass the token from the authorization header, if any
+        :param db: AsyncSession: Get the database session, used on a user cache miss
+        :return: The current user
+        """
+        email = auth_service.get_email_from_access_token(token) if token else None
+
+        identifier = self.identifier or FastAPILimiter.identifier
+        route = request.scope.get("route")
+        path = route.path if route is not None else request.scope["path"]
+        key = f"{FastAPILimiter.prefix}:{await identifier(request)}:{request.method}:{path}"
+
+        pexpire, cached = await self._run_script(lambda: self._check_and_get(key, email))
+        if pexpire != 0:
+            callback = self.callback or FastAPILimiter.http_callback
+            return await callback(request, response, pexpire)
+
+        if email is None:
+            raise auth_service.credentials_exception()
+        return await auth_service.load_user(email, cached, db)
+
+    async def _check_and_get(self, key: str, email: str | None) -> tuple[int, bytes | None]:
+        """
+        The _check_and_get function runs the rate limit script and reads the user's cache key in one pipeline.
+
+        :param key: str: The rate limit key of the client and route
+        :param email: str | None: The email of the user to read from the user cache, None to skip the read
+        :return: The rate limit result (see _check) and the cached user or None
+        """
+        pipe = FastAPILimiter.redis.pipeline(transaction=False)
+        pipe.evalsha(self.lua_sha, *self._script_args(key))
+        if email is not None:
+            pipe.get(user_cache_key(email))
+        results = await pipe.execute()
+        return results[0], results[1] if email is not None else None
@@ -1,3 +1,5 @@
+from typing import Iterable
+
 from fastapi import Request, Depends, HTTPException, status
 
 from src.entity.models import Role, User
@@ -5,11 +7,12 @@ from src.services.auth import auth_service
 
 
 class RoleAccess:
-    def __init__(self, allowed_roles: list[Role]):
-        self.allowed_roles = allowed_roles
+    __slots__ = ("allowed_roles",)
+
+    def __init__(self, allowed_roles: Iterable[Role]):
+        self.allowed_roles = frozenset(allowed_roles)
 
     async def __call__(self, request: Request, user: User = Depends(auth_service.get_current_user)):
-        print(user.role, self.allowed_roles)
         if user.role not in self.allowed_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -26,7 +26,7 @@ async def init_models_wrap():
             await conn.run_sync(Base.metadata.drop_all)
             await conn.run_sync(Base.metadata.create_all)
         async with TestingSessionLocal() as session:
-            hash_password = auth_service.get_password_hash(test_user["password"])
+            hash_password = await auth_service.get_password_hash(test_user["password"])
             current_user = User(username=test_user["username"], email=test_user["email"], password=hash_password,
                                 confirmed=True, role="admin")
             session.add(current_user)
@@ -43,9 +43,9 @@ def client():
         session = TestingSessionLocal()
         try:
             yield session
-        except Exception as err:
-            print(err)
+        except Exception:
             await session.rollback()
+            raise
         finally:
             await session.close()
 
@@ -1,9 +1,6 @@
 from unittest.mock import Mock
-from src.entity.models import User
-import pytest
-from tests.conftest import TestingSessionLocal
 from src.conf import messages
-from sqlalchemy import select
+from src.services.auth import auth_service
 from main import app
 
 user_data = {"username": "bober",
@@ -43,14 +40,11 @@ def test_not_confirmed_login(client):
     assert data["detail"] == "Email not confirmed"
 
 
-@pytest.mark.asyncio
-async def test_login(client):
-    async with TestingSessionLocal() as session:
-        current_user = await session.execute(select(User).where(User.email == user_data.get("email")))
-        current_user = current_user.scalar_one_or_none()
-        if current_user:
-            current_user.confirmed = True
-            await session.commit()
+def test_login(client):
+    # Confirm through the app, so the cached unconfirmed user is dropped as well
+    token = auth_service.create_email_token({"sub": user_data.get("email")})
+    response = client.get(f"api/auth/confirmed_email/{token}")
+    assert response.status_code == 200, response.text
 
     response = client.post("api/auth/login",
                            data={"username": user_data.get("email"), "password": user_data.get("password")})
@@ -66,7 +60,7 @@ def test_wrong_password_login(client):
                            data={"username": user_data.get("email"), "password": "password"})
     assert response.status_code == 401, response.text
     data = response.json()
-    assert data["detail"] == "Invalid password"
+    assert data["detail"] == "Invalid email or password"
 
 
 def test_wrong_email_login(client):
@@ -74,7 +68,7 @@ def test_wrong_email_login(client):
                            data={"username": "email", "password": user_data.get("password")})
     assert response.status_code == 401, response.text
     data = response.json()
-    assert data["detail"] == "Invalid email"
+    assert data["detail"] == "Invalid email or password"
 
 
 def test_validation_error_login(client): #passed
@@ -83,3 +77,12 @@ def test_validation_error_login(client): #passed
     assert response.status_code == 422, response.text
     data = response.json()
     assert "detail" in data
+
+
+def test_request_email_unknown_user(client, monkeypatch):
+    mock_send_email = Mock()
+    monkeypatch.setattr("src.routes.auth.send_email", mock_send_email)
+    response = client.post("api/auth/request_email", json={"email": "nobody@example.com"})
+    assert response.status_code == 200, response.text
+    assert response.json()["message"] == "Check your email for confirmation."
+    mock_send_email.assert_not_called()
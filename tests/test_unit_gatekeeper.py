@@ -0,0 +1,87 @@
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import orjson
+
+import main
+from main import GatekeeperMiddleware, ip_rejection
+
+
+def http_scope(host: str | None, user_agent: bytes | None = b"pytest") -> dict:
+    headers = [(b"host", b"localhost")]
+    if user_agent is not None:
+        headers.append((b"user-agent", user_agent))
+    return {"type": "http", "method": "GET", "path": "/", "headers": headers,
+            "client": (host, 50000) if host is not None else None}
+
+
+class TestGatekeeperMiddleware(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        ip_rejection.cache_clear()
+        self.addCleanup(ip_rejection.cache_clear)
+        self.app = AsyncMock()
+        self.middleware = GatekeeperMiddleware(self.app)
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    async def call(self, scope):
+        await self.middleware(scope, AsyncMock(), self.send)
+
+    def assert_rejected(self, detail: str):
+        self.app.assert_not_called()
+        self.assertEqual(self.sent[0]["status"], 403)
+        self.assertEqual(orjson.loads(self.sent[1]["body"]), {"detail": detail})
+
+    async def test_not_allowed_ip(self):
+        await self.call(http_scope("10.0.0.1"))
+        self.assert_rejected("Not allowed IP address")
+
+    async def test_banned_ip(self):
+        with patch.object(main, "allowed_ips", main.allowed_ips | main.banned_ips):
+            await self.call(http_scope("192.168.1.1"))
+        self.assert_rejected("You are banned")
+
+    async def test_non_ip_host(self):
+        await self.call(http_scope("testclient"))
+        self.assert_rejected("Not allowed IP address")
+
+    async def test_non_ip_host_with_all_ips_allowed(self):
+        with patch.object(main, "allow_all_ips", True):
+            await self.call(http_scope("testclient"))
+        self.app.assert_awaited_once()
+
+    async def test_banned_user_agent(self):
+        await self.call(http_scope("127.0.0.1", b"Mozilla/5.0 (compatible; Googlebot/2.1)"))
+        self.assert_rejected("You are banned")
+
+    async def test_missing_user_agent(self):
+        scope = http_scope("127.0.0.1", None)
+        await self.call(scope)
+        self.app.assert_awaited_once()
+        self.assertIs(self.app.call_args.args[0], scope)
+        self.assertEqual(self.sent, [])
+
+    async def test_non_http_scope_passes_through(self):
+        scope = {"type": "lifespan"}
+        await self.call(scope)
+        self.app.assert_awaited_once()
+        self.assertIs(self.app.call_args.args[0], scope)
+
+
+class TestIpRejection(unittest.TestCase):
+    def setUp(self) -> None:
+        ip_rejection.cache_clear()
+        self.addCleanup(ip_rejection.cache_clear)
+
+    def test_decisions(self):
+        self.assertIsNone(ip_rejection("127.0.0.1"))
+        self.assertEqual(ip_rejection("10.0.0.1"), "not_allowed")
+        self.assertEqual(ip_rejection("testclient"), "not_allowed")
+
+    def test_host_is_parsed_once(self):
+        with patch.object(main, "ip_address", wraps=main.ip_address) as parse:
+            ip_rejection("127.0.0.1")
+            ip_rejection("127.0.0.1")
+        parse.assert_called_once_with("127.0.0.1")
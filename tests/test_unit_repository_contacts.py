@@ -1,27 +1,33 @@
 import unittest
-from unittest.mock import MagicMock, AsyncMock, Mock
+from datetime import datetime
+from unittest.mock import MagicMock, AsyncMock, Mock, patch
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.entity.models import Contact, User
 from src.schemas.contact import ContactSchema, ContactUpdate
 from src.repository.contacts import create_contact, get_all_contacts, get_contact, get_contacts, \
-     update_contact, delete_contact
+     update_contact, delete_contact, get_contacts_with_birthdays, stream_contacts, search_contacts_by
 
 
 class TestAsyncContacts(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.user = User(id=1, username='test_user', email='test@ex.ua', password='qwerty', confirmed=True)
+        cls.session = AsyncMock(spec_set=AsyncSession)
+        cls.contacts = [Contact(id=1, first_name='test_first_name_1', last_name='test_last_name_1',
+                                email='test1@ex.ua', user=cls.user),
+                        Contact(id=2, first_name='test_first_name_2', last_name='test_last_name_2',
+                                email='test2@ex.ua', user=cls.user)]
+
     def setUp(self) -> None:
-        self.user = User(id=1, username='test_user', email='test@ex.ua', password='qwerty', confirmed=True)
-        self.session = AsyncMock(spec=AsyncSession)
+        self.session.reset_mock(return_value=True)
 
     async def test_get_all_contacts(self):
         print(' test_1')
         limit = 10
         offset = 0
-        contacts = [Contact(id=1, first_name='test_first_name_1', last_name='test_last_name_1', email='test1@ex.ua',
-                            user=self.user),
-                    Contact(id=2, first_name='test_first_name_2', last_name='test_last_name_2', email='test2@ex.ua',
-                            user=self.user)]
+        contacts = self.contacts
         mocked_contacts = MagicMock()
         mocked_contacts.scalars.return_value.all.return_value = contacts
         self.session.execute.return_value = mocked_contacts
@@ -32,20 +38,44 @@ class TestAsyncContacts(unittest.IsolatedAsyncioTestCase):
         print(' test_2')
         limit = 10
         offset = 0
-        contacts = [Contact(id=1, first_name='test_first_name_1', last_name='test_last_name_1', email='test1@ex.ua',
-                            user=self.user),
-                    Contact(id=2, first_name='test_first_name_2', last_name='test_last_name_2', email='test2@ex.ua',
-                            user=self.user)]
+        contacts = self.contacts
         mocked_contacts = Mock()
         mocked_contacts.scalars.return_value.all.return_value = contacts
         self.session.execute.return_value = mocked_contacts
         result = await get_contacts(limit, offset, self.session, self.user)
         self.assertEqual(result, contacts)
 
+    async def test_get_contacts_after_id(self):
+        limit = 10
+        contacts = [Contact(id=3, first_name='test_first_name_3', last_name='test_last_name_3', email='test3@ex.ua',
+                            user=self.user)]
+        mocked_contacts = Mock()
+        mocked_contacts.scalars.return_value.all.return_value = contacts
+        self.session.execute.return_value = mocked_contacts
+        result = await get_contacts(limit, 0, self.session, self.user, after_id=2)
+        stmt = self.session.execute.call_args.args[0]
+        self.assertIn("contacts.id >", str(stmt))
+        self.assertIsNone(stmt._offset_clause)
+        self.assertEqual(result, contacts)
+
+    async def test_stream_contacts(self):
+        async def rows():
+            for contact in self.contacts:
+                yield contact
+
+        self.session.stream_scalars.return_value = rows()
+        result = [contact async for contact in stream_contacts(10, 0, self.session, self.user)]
+        self.session.stream_scalars.assert_called_once()
+        self.assertEqual(result, self.contacts)
+
     async def test_create_contact(self):
         print(' test_3')
         body = ContactSchema(first_name='test_first_name_1', last_name='test_last_name_1', email='test1@ex.ua')
+        self.session.scalar.return_value = Contact(id=1, **body.model_dump(), user_id=self.user.id)
         result = await create_contact(body, self.session, self.user)
+        stmt = self.session.scalar.call_args.args[0]
+        self.assertEqual(stmt.compile().params["user_id"], self.user.id)
+        self.session.commit.assert_called_once()
         self.assertIsInstance(result, Contact)
         self.assertEqual(result.first_name, body.first_name)
         self.assertEqual(result.last_name, body.last_name)
@@ -54,12 +84,14 @@ class TestAsyncContacts(unittest.IsolatedAsyncioTestCase):
     async def test_update_contact(self):
         print(' test_4')
         body = ContactUpdate(first_name='test_first_name_1', last_name='test_last_name_1', email='test1@ex.ua')
-        mocked_contacts = MagicMock()
-        mocked_contacts.scalar_one_or_none.return_value = Contact(id=1, first_name='test_first_name_1',
-                                                                  last_name='test_last_name_1', email='test1@ex.ua',
-                                                                  user=self.user)
-        self.session.execute.return_value = mocked_contacts
+        self.session.scalar.return_value = self.contacts[0]
         result = await update_contact(1, body, self.session, self.user)
+        self.session.scalar.assert_called_once()
+        compiled = self.session.scalar.call_args.args[0].compile()
+        self.assertIn("contacts.user_id = :user_id_1", str(compiled))
+        self.assertEqual(compiled.params["user_id_1"], self.user.id)
+        self.assertEqual(set(compiled.params) - {"id_1", "user_id_1"}, set(body.model_dump(exclude_unset=True)))
+        self.session.commit.assert_called_once()
         self.assertIsInstance(result, Contact)
         self.assertEqual(result.first_name, body.first_name)
         self.assertEqual(result.last_name, body.last_name)
@@ -67,23 +99,60 @@ class TestAsyncContacts(unittest.IsolatedAsyncioTestCase):
 
     async def test_delete_contact(self):
         print(' test_5')
-        mocked_contacts = MagicMock()
-        mocked_contacts.scalar_one_or_none.return_value = Contact(id=1, first_name='test_first_name_1',
-                                                                  last_name='test_last_name_1', email='test1@ex.ua',
-                                                                  user=self.user)
-        self.session.execute.return_value = mocked_contacts
+        self.session.scalar.return_value = self.contacts[0]
         result = await delete_contact(1, self.session, self.user)
-        self.session.delete.assert_called_once()
+        self.session.scalar.assert_called_once()
+        compiled = self.session.scalar.call_args.args[0].compile()
+        self.assertIn("contacts.user_id = :user_id_1", str(compiled))
+        self.assertEqual(compiled.params["user_id_1"], self.user.id)
+        self.session.delete.assert_not_called()
         self.session.commit.assert_called_once()
         self.assertIsInstance(result, Contact)
 
     async def test_get_contact(self):
         print(' test_6')
-        mocked_contacts = MagicMock()
-        mocked_contacts.scalar_one_or_none.return_value = Contact(id=1, first_name='test_first_name_1',
-                                                                  last_name='test_last_name_1', email='test1@ex.ua',
-                                                                  user=self.user)
-        self.session.execute.return_value = mocked_contacts
+        self.session.scalar.return_value = self.contacts[0]
         result = await get_contact(1, self.session, self.user)
         self.assertIsInstance(result, Contact)
 
+    @patch("src.repository.contacts.datetime")
+    async def test_get_contacts_with_birthdays(self, mocked_datetime):
+        mocked_datetime.now.return_value = datetime(2024, 6, 10)
+        mocked_contacts = MagicMock()
+        mocked_contacts.scalars.return_value.all.return_value = []
+        self.session.execute.return_value = mocked_contacts
+        await get_contacts_with_birthdays(7, self.session)
+        stmt = self.session.execute.call_args.args[0]
+        self.assertIn("BETWEEN", str(stmt))
+        self.assertNotIn(" OR ", str(stmt))
+        self.assertEqual(sorted(stmt.compile().params.values()), [610, 617])
+
+    @patch("src.repository.contacts.datetime")
+    async def test_get_contacts_with_birthdays_year_wrap(self, mocked_datetime):
+        mocked_datetime.now.return_value = datetime(2024, 12, 28)
+        mocked_contacts = MagicMock()
+        mocked_contacts.scalars.return_value.all.return_value = []
+        self.session.execute.return_value = mocked_contacts
+        await get_contacts_with_birthdays(7, self.session)
+        stmt = self.session.execute.call_args.args[0]
+        self.assertIn(" OR ", str(stmt))
+        self.assertEqual(sorted(stmt.compile().params.values()), [104, 1228])
+
+    async def test_search_contacts_by(self):
+        mocked_contacts = MagicMock()
+        mocked_contacts.scalars.return_value.all.return_value = self.contacts[:1]
+        self.session.execute.return_value = mocked_contacts
+        result = await search_contacts_by(self.session, email='test1@ex.ua')
+        stmt = str(self.session.execute.call_args.args[0])
+        self.assertIn("contacts.email =", stmt)
+        self.assertNotIn("IS NULL", stmt)
+        self.assertEqual(result, self.contacts[:1])
+
+    async def test_search_contacts_by_skips_empty_criteria(self):
+        mocked_contacts = MagicMock()
+        mocked_contacts.scalars.return_value.all.return_value = self.contacts[:1]
+        self.session.execute.return_value = mocked_contacts
+        await search_contacts_by(self.session, first_name='', email='test1@ex.ua')
+        stmt = self.session.execute.call_args.args[0]
+        self.assertNotIn("contacts.first_name", str(stmt.whereclause))
+        self.assertEqual(list(stmt.compile().params.values()), ['test1@ex.ua'])
@@ -0,0 +1,91 @@
+import unittest
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import orjson
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.entity.models import Base, Role, User
+from src.repository.users import USER_CACHE_TTL, deserialize_user, load_user_by_email, serialize_user, \
+    update_token, user_cache_key
+
+
+class TestAsyncUserCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.user = User(id=1, username='test_user', email='test@ex.ua', password='hash', refresh_token='token',
+                         avatar=None, role=Role.moderator, confirmed=True,
+                         created_at=date(2024, 1, 2), updated_at=date(2024, 3, 4))
+        self.session = AsyncMock(spec_set=AsyncSession)
+        cache_patcher = patch("src.repository.users.cache", new_callable=AsyncMock)
+        self.cache = cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+
+    def test_serialize_user_leaves_out_secrets(self):
+        row = orjson.loads(serialize_user(self.user))
+        self.assertNotIn("password", row)
+        self.assertNotIn("refresh_token", row)
+        self.assertEqual(row["role"], "moderator")
+        self.assertEqual(row["created_at"], "2024-01-02")
+
+    def test_deserialize_user(self):
+        user = deserialize_user(serialize_user(self.user))
+        self.assertIsInstance(user.role, Role)
+        self.assertEqual(user.role, Role.moderator)
+        self.assertEqual(user.created_at, date(2024, 1, 2))
+        self.assertEqual(user.updated_at, date(2024, 3, 4))
+        self.assertEqual((user.id, user.username, user.email, user.confirmed), (1, 'test_user', 'test@ex.ua', True))
+        state = inspect(user)
+        self.assertTrue(state.detached)
+        self.assertLessEqual({"password", "refresh_token"}, state.unloaded)
+
+    async def test_load_user_by_email_cache_hit(self):
+        self.session.merge.side_effect = lambda user, load: user
+        result = await load_user_by_email(self.user.email, serialize_user(self.user), self.session)
+        self.session.execute.assert_not_called()
+        self.assertFalse(self.session.merge.call_args.kwargs["load"])
+        self.assertEqual(result.email, self.user.email)
+        self.cache.set.assert_not_called()
+
+    async def test_load_user_by_email_cache_miss(self):
+        mocked_user = MagicMock()
+        mocked_user.scalar_one_or_none.return_value = self.user
+        self.session.execute.return_value = mocked_user
+        result = await load_user_by_email(self.user.email, None, self.session)
+        self.assertIs(result, self.user)
+        self.session.merge.assert_not_called()
+        self.cache.set.assert_called_once_with(user_cache_key(self.user.email), serialize_user(self.user),
+                                               ex=USER_CACHE_TTL)
+
+    async def test_load_user_by_email_unknown(self):
+        mocked_user = MagicMock()
+        mocked_user.scalar_one_or_none.return_value = None
+        self.session.execute.return_value = mocked_user
+        result = await load_user_by_email('nobody@ex.ua', None, self.session)
+        self.assertIsNone(result)
+        self.cache.set.assert_not_called()
+
+    async def test_merged_cached_user_is_updated(self):
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        self.addAsyncCleanup(engine.dispose)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with sessions() as session:
+            session.add(User(username='test_user', email='test@ex.ua', password='hash', role=Role.user))
+            await session.commit()
+            cached = serialize_user(await session.scalar(select(User)))
+
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        async with sessions() as session:
+            user = await load_user_by_email('test@ex.ua', cached, session)
+            await update_token(user, 'new-token', session)
+        self.assertTrue(any(statement.startswith("UPDATE users") for statement in statements))
+        self.assertFalse(any(statement.startswith("SELECT") for statement in statements))
+        self.cache.delete.assert_called_once_with(user_cache_key('test@ex.ua'))
+
+        async with sessions() as session:
+            self.assertEqual(await session.scalar(select(User.refresh_token)), 'new-token')
@@ -0,0 +1,67 @@
+import hashlib
+import time
+import unittest
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import patch
+
+from src.services import auth
+from src.services.auth import Auth, run_in_hash_pool
+
+
+def token_key(token: str) -> bytes:
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+
+class TestAccessTokenCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.auth = Auth()
+        self.auth.token_cache = OrderedDict()
+
+    async def test_valid_token_is_cached(self):
+        token = await self.auth.create_access_token(data={"sub": "test@ex.ua"})
+        self.assertEqual(self.auth.get_email_from_access_token(token), "test@ex.ua")
+        self.assertEqual(self.auth.token_cache[token_key(token)][0], "test@ex.ua")
+
+    async def test_expired_cached_entry_is_decoded_again(self):
+        token = await self.auth.create_access_token(data={"sub": "test@ex.ua"})
+        self.auth.token_cache[token_key(token)] = ("stale@ex.ua", int(time.time()) - 1)
+        self.assertEqual(self.auth.get_email_from_access_token(token), "test@ex.ua")
+        self.assertEqual(self.auth.token_cache[token_key(token)][0], "test@ex.ua")
+
+    async def test_expired_token_returns_none(self):
+        token = await self.auth.create_access_token(data={"sub": "test@ex.ua"}, expires_delta=-10)
+        self.assertIsNone(self.auth.get_email_from_access_token(token))
+        self.assertNotIn(token_key(token), self.auth.token_cache)
+
+    async def test_refresh_token_is_rejected_and_not_cached(self):
+        token = await self.auth.create_refresh_token(data={"sub": "test@ex.ua"})
+        self.assertIsNone(self.auth.get_email_from_access_token(token))
+        self.assertNotIn(token_key(token), self.auth.token_cache)
+
+    async def test_entries_past_the_size_are_evicted(self):
+        self.auth.TOKEN_CACHE_SIZE = 2
+        tokens = [await self.auth.create_access_token(data={"sub": f"user{i}@ex.ua"}) for i in range(3)]
+        for token in tokens:
+            self.auth.get_email_from_access_token(token)
+        self.assertEqual(list(self.auth.token_cache), [token_key(token) for token in tokens[1:]])
+
+    def test_invalid_token_returns_none(self):
+        self.assertIsNone(self.auth.get_email_from_access_token("not.a.token"))
+        self.assertEqual(len(self.auth.token_cache), 0)
+
+
+class BrokenPool(Executor):
+    def submit(self, fn, /, *args, **kwargs):
+        raise BrokenProcessPool("a worker died")
+
+
+class TestHashPool(unittest.IsolatedAsyncioTestCase):
+    async def test_broken_pool_is_replaced(self):
+        replacement = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(replacement.shutdown)
+        with patch.object(auth, "hash_pool", BrokenPool()), \
+                patch.object(auth, "new_hash_pool", return_value=replacement):
+            self.assertEqual(await run_in_hash_pool(pow, 2, 3), 8)
+            self.assertIs(auth.hash_pool, replacement)
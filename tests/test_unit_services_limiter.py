@@ -0,0 +1,78 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import HTTPException, Response
+from fastapi_limiter import FastAPILimiter, http_default_callback
+from redis.exceptions import NoScriptError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import Request
+
+from src.entity.models import Role, User
+from src.repository.users import serialize_user, user_cache_key
+from src.services.auth import auth_service
+from src.services.limiter import AuthRateLimiter
+
+
+class TestAuthRateLimiter(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.user = User(id=1, username='test_user', email='test@ex.ua', role=Role.user, confirmed=True)
+        self.pipe = MagicMock()
+        self.pipe.execute = AsyncMock()
+        self.redis = MagicMock()
+        self.redis.pipeline.return_value = self.pipe
+        self.redis.script_load = AsyncMock(return_value="new-sha")
+        for name, value in (("redis", self.redis), ("prefix", "test"),
+                            ("identifier", AsyncMock(return_value="1.2.3.4")),
+                            ("http_callback", http_default_callback)):
+            patcher = patch.object(FastAPILimiter, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch.object(AuthRateLimiter, "lua_sha", "sha")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.limiter = AuthRateLimiter(times=1, seconds=5)
+        self.request = Request({"type": "http", "method": "GET", "path": "/api/users/me", "headers": []})
+        self.db = AsyncMock(spec_set=AsyncSession)
+        self.db.merge.side_effect = lambda user, load: user
+
+    async def call(self, token):
+        return await self.limiter(self.request, Response(), token, self.db)
+
+    async def test_bad_token_over_the_limit_gets_429(self):
+        self.pipe.execute.return_value = [3000]
+        with self.assertRaises(HTTPException) as error:
+            await self.call("not.a.token")
+        self.assertEqual(error.exception.status_code, 429)
+        self.pipe.get.assert_not_called()
+
+    async def test_missing_token_over_the_limit_gets_429(self):
+        self.pipe.execute.return_value = [3000]
+        with self.assertRaises(HTTPException) as error:
+            await self.call(None)
+        self.assertEqual(error.exception.status_code, 429)
+
+    async def test_bad_token_within_the_limit_gets_401(self):
+        self.pipe.execute.return_value = [0]
+        with self.assertRaises(HTTPException) as error:
+            await self.call("not.a.token")
+        self.assertEqual(error.exception.status_code, 401)
+        self.pipe.evalsha.assert_called_once()
+        self.db.execute.assert_not_called()
+
+    async def test_cache_hit_skips_the_database(self):
+        token = await auth_service.create_access_token(data={"sub": self.user.email})
+        self.pipe.execute.return_value = [0, serialize_user(self.user)]
+        user = await self.call(token)
+        self.assertEqual(user.email, self.user.email)
+        self.pipe.get.assert_called_once_with(user_cache_key(self.user.email))
+        self.redis.pipeline.assert_called_once_with(transaction=False)
+        self.db.execute.assert_not_called()
+
+    async def test_noscript_reloads_the_script(self):
+        token = await auth_service.create_access_token(data={"sub": self.user.email})
+        self.pipe.execute.side_effect = [NoScriptError("NOSCRIPT"), [0, serialize_user(self.user)]]
+        user = await self.call(token)
+        self.assertEqual(user.email, self.user.email)
+        self.redis.script_load.assert_awaited_once()
+        self.assertEqual([call.args[0] for call in self.pipe.evalsha.call_args_list], ["sha", "new-sha"])